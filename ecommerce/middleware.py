@@ -0,0 +1,51 @@
+import logging
+from collections import Counter
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# How many times the same SQL may run in one request before it is flagged
+DEFAULT_N_PLUS_ONE_THRESHOLD = 3
+
+
+def n_plus_one_threshold(limit):
+    """Override the repeated-query limit for a single view (1 = no duplicates)"""
+    def decorator(view_func):
+        view_func.n_plus_one_threshold = limit
+        return view_func
+    return decorator
+
+
+class QuerySnitchMiddleware:
+    """
+    Dev-only N+1 detector: counts identical SQL statements per request and,
+    when one repeats more than the view's threshold, logs it and sets the
+    X-Query-Snitch-Detected header so tests can assert on it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counts = Counter()
+
+        def count_query(execute, sql, params, many, context):
+            counts[sql] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+
+        limit = getattr(request, '_n_plus_one_threshold', DEFAULT_N_PLUS_ONE_THRESHOLD)
+        repeated = {sql: n for sql, n in counts.items() if n > limit}
+        if repeated:
+            response['X-Query-Snitch-Detected'] = str(len(repeated))
+            for sql, n in repeated.items():
+                logger.warning('Possible N+1 on %s: %d x %s', request.path, n, sql)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._n_plus_one_threshold = getattr(
+            view_func, 'n_plus_one_threshold', DEFAULT_N_PLUS_ONE_THRESHOLD
+        )
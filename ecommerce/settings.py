@@ -21,6 +21,7 @@ INSTALLED_APPS = [
     'corsheaders',
     'drf_yasg',
     'django_filters',  # <--- FIX 2: Added missing app here
+    'cachalot',
     'products',
     'orders',
     'users',
@@ -36,6 +37,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Flags repeated queries (N+1) with an X-Query-Snitch-Detected header in dev
+    *(['ecommerce.middleware.QuerySnitchMiddleware'] if DEBUG else []),
 ]
 
 ROOT_URLCONF = 'ecommerce.urls'
@@ -66,6 +69,25 @@ DATABASES = {
         cast=dj_database_url.parse
     )
 }
+# Persistent connections: reuse each worker's connection instead of reconnecting per request
+DATABASES['default']['CONN_MAX_AGE'] = config('CONN_MAX_AGE', default=60, cast=int)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+# Set when running behind PgBouncer in transaction pooling mode
+DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = config('DISABLE_SERVER_SIDE_CURSORS', default=False, cast=bool)
+
+# Shared cache (Redis) when REDIS_URL is set, otherwise Django's per-process default
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+# Transparent ORM query cache (django-cachalot), invalidated per table on writes.
+# Only enabled with a shared cache: a per-process cache can't see other workers' writes.
+CACHALOT_ENABLED = bool(REDIS_URL)
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
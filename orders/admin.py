@@ -1,5 +1,5 @@
 from django.contrib import admin
-from django.utils.safestring import mark_safe # REQUIRED for rendering HTML
+from django.utils.html import format_html # Escapes values while rendering HTML
 from .models import Order, OrderItem, Cart, CartItem, ShippingAddress 
 
 # ------------------------------------------
@@ -10,8 +10,16 @@ from .models import Order, OrderItem, Cart, CartItem, ShippingAddress
 class ShippingAddressAdmin(admin.ModelAdmin):
     """Admin interface for managing reusable shipping addresses."""
     list_display = ['full_name', 'user', 'city', 'zip_code', 'is_default']
-    list_filter = ['is_default', 'state', 'city']
-    search_fields = ['full_name', 'phone', 'address', 'city', 'user__username']
+    # city/state are searchable rather than filters, which would run SELECT DISTINCT on every load
+    list_filter = ['is_default']
+    list_select_related = ('user',)
+    # Identifiers use __exact lookups (index-friendly, unlike '=' which is iexact);
+    # free-text fields stay icontains so multi-word searches like "New York" still match
+    search_fields = ['full_name', 'phone__exact', 'zip_code__exact', 'city', 'state', 'user__username__exact']
+    # Skip the full COUNT(*) and cap page sizes so changelists scale with the page, not the table
+    show_full_result_count = False
+    list_per_page = 50
+    list_max_show_all = 200
     
     fieldsets = (
         (None, {
@@ -29,25 +37,24 @@ class ShippingAddressAdmin(admin.ModelAdmin):
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
-    
-    # Wrapper method to correctly display the @property 'subtotal'
-    def line_item_subtotal(self, obj):
-        return obj.subtotal
-    line_item_subtotal.short_description = 'Line Subtotal'
-
-    readonly_fields = ['line_item_subtotal'] 
+    readonly_fields = ['subtotal'] 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     # Uses a new concise method for list view (optional but good practice)
     list_display = ['order_number', 'user', 'shipping_address_for_list', 'total_amount', 'status', 'created_at']
-    list_filter = ['status', 'created_at', 'payment_method']
+    list_filter = ['status', 'payment_method']
+    date_hierarchy = 'created_at'
+    # user and shipping address are rendered per row; join them in the changelist query
+    list_select_related = ('user', 'shipping_address')
+    show_full_result_count = False
+    list_per_page = 50
+    list_max_show_all = 200
     
+    # Exact lookups can use the unique order_number and username indexes; address joins are left out
     search_fields = [
-        'order_number', 
-        'user__username', 
-        'shipping_address__full_name',
-        'shipping_address__phone'
+        'order_number__exact', 
+        'user__username__exact', 
     ]
     
     inlines = [OrderItemInline]
@@ -59,14 +66,17 @@ class OrderAdmin(admin.ModelAdmin):
     def shipping_detail_display(self, obj):
         if obj.shipping_address:
             address = obj.shipping_address
-            # Using mark_safe to render HTML for clean formatting
-            html = f"""
-            <strong>Recipient:</strong> {address.full_name}<br/>
-            <strong>Phone:</strong> {address.phone}<br/>
-            <strong>Address:</strong> {address.address}<br/>
-            {address.city}, {address.state} - {address.zip_code}
-            """
-            return mark_safe(html)
+            # format_html escapes the user-supplied address fields
+            return format_html(
+                """
+                <strong>Recipient:</strong> {}<br/>
+                <strong>Phone:</strong> {}<br/>
+                <strong>Address:</strong> {}<br/>
+                {}, {} - {}
+                """,
+                address.full_name, address.phone, address.address,
+                address.city, address.state, address.zip_code,
+            )
         return "No Shipping Address Attached"
     
     shipping_detail_display.short_description = 'Shipping Address Details'
@@ -74,12 +84,7 @@ class OrderAdmin(admin.ModelAdmin):
     # METHOD FOR LIST VIEW (Concise details for the table overview)
     def shipping_address_for_list(self, obj):
         if obj.shipping_address:
-            address = obj.shipping_address
-            html = f"""
-            {address.full_name}<br/>
-            <small style="color:#aaa;">{address.city}, {address.zip_code}</small>
-            """
-            return mark_safe(html)
+            return obj.shipping_address.admin_list_html
         return "N/A"
     shipping_address_for_list.short_description = 'Ship To Details'
 
@@ -109,6 +114,14 @@ class CartItemInline(admin.TabularInline):
 class CartAdmin(admin.ModelAdmin):
     list_display = ['user', 'total_price', 'updated_at']
     search_fields = ['user__username', 'user__email']
+    list_select_related = ('user',)
+    show_full_result_count = False
+    list_per_page = 50
+    list_max_show_all = 200
     inlines = [CartItemInline]
     
-    readonly_fields = ['total_price']
\ No newline at end of file
+    readonly_fields = ['total_price']
+
+    def get_queryset(self, request):
+        # total_price walks every item's product; prefetch them once per page
+        return super().get_queryset(request).prefetch_related('items__product')
\ No newline at end of file
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-15 10:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def keep_latest_default_address(apps, schema_editor):
+    """Unset all but the newest default address per user before adding the constraint."""
+    ShippingAddress = apps.get_model('orders', 'ShippingAddress')
+    duplicates = (
+        ShippingAddress.objects.filter(user__isnull=False, is_default=True)
+        .values('user')
+        .annotate(count=Count('id'), keep=Max('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        ShippingAddress.objects.filter(user=row['user'], is_default=True).exclude(
+            pk=row['keep']
+        ).update(is_default=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_order_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_latest_default_address, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='shippingaddress',
+            index=models.Index(fields=['user', 'is_default'], name='orders_ship_user_id_bcf520_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='shippingaddress',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('user',), name='uniq_default_addr_per_user'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-15 10:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_shippingaddress_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shippingaddress',
+            index=models.Index(fields=['user', 'zip_code'], name='orders_ship_user_id_160bdf_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-15 10:26
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_shippingaddress_user_zip_code'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderitem',
+            name='price',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=10),
+        ),
+    ]
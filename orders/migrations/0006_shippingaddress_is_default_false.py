@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-15 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_orderitem_price_default'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shippingaddress',
+            name='is_default',
+            field=models.BooleanField(default=False),
+        ),
+    ]
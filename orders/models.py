@@ -1,6 +1,13 @@
+import re
+from decimal import Decimal
+
+from django.contrib import admin
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth.models import User
 from django.conf import settings 
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 # Assuming 'Product' model is correctly imported from your products app
 from products.models import Product 
 
@@ -8,6 +15,9 @@ from products.models import Product
 # 0. SHIPPING ADDRESS MODEL
 # ==========================================
 
+# Shared by ShippingAddress.clean() and ShippingAddressSerializer
+ZIP_CODE_RE = re.compile(r'^[0-9]{5,10}$')
+
 class ShippingAddress(models.Model):
     """Stores a detailed, reusable shipping address."""
     user = models.ForeignKey(
@@ -24,11 +34,40 @@ class ShippingAddress(models.Model):
     city = models.CharField(max_length=100)
     state = models.CharField(max_length=100)
     zip_code = models.CharField(max_length=10)
-    is_default = models.BooleanField(default=True)
+    is_default = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_default']),
+            # Narrows PlaceOrderView's exact-match lookup for a reusable address to a few rows
+            models.Index(fields=['user', 'zip_code']),
+        ]
+        constraints = [
+            # A user can have at most one default address
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(is_default=True),
+                name='uniq_default_addr_per_user',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.full_name} - {self.address}, {self.city}'
 
+    def clean(self):
+        # Enforced in Python rather than as a DB CHECK: legacy admin-entered rows
+        # (e.g. 'SW1A1AA') would make the CHECK fail on every later UPDATE of them
+        if self.zip_code and not ZIP_CODE_RE.match(self.zip_code):
+            raise ValidationError({'zip_code': 'Zip code must be 5 to 10 digits.'})
+
+    @cached_property
+    def admin_list_html(self):
+        """Escaped two-line summary used by the order admin changelist."""
+        return format_html(
+            '{}<br/><small style="color:#aaa;">{}, {}</small>',
+            self.full_name, self.city, self.zip_code,
+        )
+
 
 # ==========================================
 # 1. UPDATED ORDER MODELS
@@ -62,6 +101,13 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Per-user order history: filter(user=...).order_by('-created_at')
+            models.Index(fields=['user', '-created_at']),
+            # Admin changelist adds '-pk' to the ordering for a deterministic sort
+            models.Index(fields=['-created_at', '-id'], name='order_admin_sort'),
+            models.Index(fields=['status']),
+        ]
 
     def __str__(self):
         return f"Order {self.order_number}"
@@ -71,16 +117,15 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=1)
-    price = models.DecimalField(max_digits=10, decimal_places=2)
+    price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0'))
 
     def __str__(self):
         return f"{self.quantity}x {self.product.name}"
 
-    @property
+    @admin.display(description='Line Subtotal')
+    @cached_property
     def subtotal(self):
-        # FIX IMPLEMENTED: Safely handle NoneType in case self.price is NULL/None
-        item_price = self.price if self.price is not None else 0
-        return self.quantity * item_price
+        return self.quantity * self.price
 
 
 # ==========================================
@@ -95,8 +140,9 @@ class Cart(models.Model):
     def __str__(self):
         return f"Vault of {self.user.username}"
 
-    @property
+    @cached_property
     def total_price(self):
+        # Memoized per instance; mutating views must drop it from __dict__
         return sum(item.total_price for item in self.items.all())
 
 
@@ -108,7 +154,7 @@ class CartItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
 
-    @property
+    @cached_property
     def total_price(self):
         # Assumes Product model has a 'final_price' property/field
         return self.product.final_price * self.quantity
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Order, OrderItem, Cart, CartItem, ShippingAddress # Import ShippingAddress
+from .models import Order, OrderItem, Cart, CartItem, ShippingAddress, ZIP_CODE_RE # Import ShippingAddress
 from products.models import Product
 from products.serializers import ProductSerializer
 
@@ -27,8 +27,8 @@ class ShippingAddressSerializer(serializers.ModelSerializer):
         """Custom validation for postal/zip code."""
         # The data dict here uses the backend field names ('full_name', 'zip_code')
         zip_code = data.get('zip_code')
-        if zip_code and (not zip_code.isdigit() or len(zip_code) < 5):
-            raise serializers.ValidationError({"zipCode": "Invalid postal code format. Must be at least 5 digits."})
+        if zip_code and not ZIP_CODE_RE.match(zip_code):
+            raise serializers.ValidationError({"zipCode": "Invalid postal code format. Must be 5 to 10 digits."})
         return data
 
 
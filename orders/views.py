@@ -3,8 +3,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import NotFound
 from django.shortcuts import get_object_or_404
-from django.db import transaction # Crucial for data integrity
-from django.utils.crypto import get_random_string 
+from django.db import transaction, IntegrityError # Crucial for data integrity
+from django.db.models import F, Prefetch
 import uuid
 
 # Models and Serializers
@@ -22,18 +22,48 @@ from .serializers import (
 # 1. ORDER LOGIC
 # ==========================================
 
+ORDER_NUMBER_ATTEMPTS = 3
+
+
+def generate_order_number():
+    """Random order reference with 48 bits of entropy, e.g. ORD-3F9A1C0B7E2D."""
+    return f"ORD-{uuid.uuid4().hex[:12].upper()}"
+
+
+def save_with_order_number(save, **kwargs):
+    """
+    Calls ``save`` (e.g. ``Order.objects.create`` or ``serializer.save``) with a fresh
+    order number, retrying inside a savepoint on the rare unique collision.
+    """
+    for attempt in range(ORDER_NUMBER_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return save(order_number=generate_order_number(), **kwargs)
+        except IntegrityError:
+            if attempt == ORDER_NUMBER_ATTEMPTS - 1:
+                raise
+
+
 class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
+        # Items are fetched together with just the product columns OrderItemSerializer reads
+        items = Prefetch(
+            'items',
+            queryset=OrderItem.objects.select_related('product').only(
+                'id', 'order_id', 'quantity', 'price',
+                'product__id', 'product__name', 'product__image',
+            ),
+        )
+        queryset = Order.objects.select_related('user', 'shipping_address').prefetch_related(items)
         if self.request.user.is_staff:
-            return Order.objects.all().select_related('user', 'shipping_address').prefetch_related('items')
-        return Order.objects.filter(user=self.request.user).select_related('user', 'shipping_address').prefetch_related('items')
+            return queryset
+        return queryset.filter(user=self.request.user)
 
     def perform_create(self, serializer):
-        order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-        serializer.save(user=self.request.user, order_number=order_number)
+        save_with_order_number(serializer.save, user=self.request.user)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
     def update_status(self, request, pk=None):
@@ -62,7 +92,6 @@ class PlaceOrderView(views.APIView):
         # 1. Prepare Data
         shipping_details = request.data.get('shipping_details', {})
         payment_method = request.data.get('payment_method', 'COD')
-        total_amount_from_frontend = request.data.get('total_amount') 
         
         # Extract the frontend-only flag before validation, as the serializer doesn't have 'isDefault'
         # The user's input may have overridden the initial pre-filled value.
@@ -81,45 +110,65 @@ class PlaceOrderView(views.APIView):
         try:
             with transaction.atomic():
                 # 3a. Retrieve and Validate Cart
-                cart = get_object_or_404(Cart, user=user)
-                cart_items = cart.items.select_related('product').all()
+                # Lock the cart row so a double-submitted checkout waits here and then sees
+                # the emptied cart instead of creating a duplicate order.
+                cart = Cart.objects.select_for_update().get(user=user)
+                # Materialized once with only the columns checkout needs (final_price is
+                # derived from price/discount_price)
+                cart_items = list(
+                    cart.items.select_related('product').only(
+                        'id', 'cart_id', 'quantity',
+                        'product__id', 'product__name', 'product__price',
+                        'product__discount_price', 'product__stock',
+                    )
+                )
                 
                 if not cart_items:
                     return Response({"error": "Your vault is empty. Cannot place an order."}, status=status.HTTP_400_BAD_REQUEST)
 
-                # IMPORTANT SECURITY STEP: Recalculate total on the backend (omitted for brevity, but vital)
-                # actual_cart_subtotal = cart.total_price 
-                # if abs(float(actual_cart_subtotal) - float(total_amount_from_frontend)) > 0.10: 
-                #     raise Exception("Price mismatch.")
+                for item in cart_items:
+                    if item.product.stock < item.quantity:
+                        return Response(
+                            {"error": f"Not enough stock available for {item.product.name}."},
+                            status=status.HTTP_400_BAD_REQUEST
+                        )
 
+                # The order total is always computed on the backend; the frontend value is not trusted
+                total_amount = sum(item.quantity * item.product.final_price for item in cart_items)
 
                 # 3b. Save or Retrieve Shipping Address
-                # Use validated data (which is now in snake_case keys) to find or create the address
-                shipping_address_instance, created = ShippingAddress.objects.get_or_create(
-                    user=user,
-                    # We match on all unique fields except `is_default` to see if this address exists
-                    defaults=address_serializer.validated_data,
-                    **address_serializer.validated_data
-                )
+                # Reuse a saved row only when every field matches (DRF already trims whitespace).
+                # Rows are never edited here: earlier orders point at them through shipping_address.
+                address_data = dict(address_serializer.validated_data)
+                shipping_address_instance = ShippingAddress.objects.filter(
+                    user=user, **address_data
+                ).first()
+
+                if shipping_address_instance is None:
+                    # New addresses are never created as default: at most one default per user is
+                    # enforced by the DB, so promotion happens below after unsetting the old one.
+                    shipping_address_instance = ShippingAddress.objects.create(
+                        user=user, is_default=False, **address_data
+                    )
                 
                 # 3c. Handle Default Address Logic (The ENHANCEMENT)
-                if is_default_flag:
-                    # 1. Unset the default flag on ALL other addresses for this user
+                # A user's first address always becomes their default
+                make_default = is_default_flag or not ShippingAddress.objects.filter(user=user, is_default=True).exists()
+                if make_default and not shipping_address_instance.is_default:
+                    # 1. Unset the current default for this user (at most one row)
                     ShippingAddress.objects.filter(user=user, is_default=True).update(is_default=False)
                     
                     # 2. Set the current/new address as default
                     shipping_address_instance.is_default = True
-                    shipping_address_instance.save()
+                    shipping_address_instance.save(update_fields=['is_default'])
                     
                 
                 # 3d. Create the Order
-                order_number = f"ORD-{get_random_string(length=8).upper()}"
-                
-                order = Order.objects.create(
+                order = save_with_order_number(
+                    Order.objects.create,
                     user=user,
-                    order_number=order_number,
                     shipping_address=shipping_address_instance, 
-                    total_amount=total_amount_from_frontend, 
+                    total_amount=total_amount, 
                     payment_method=payment_method,
                     status='processing'
                 )
@@ -133,10 +182,13 @@ class PlaceOrderView(views.APIView):
                         price=item.product.final_price 
                     ) for item in cart_items
                 ]
-                OrderItem.objects.bulk_create(order_items_to_create)
+                # Batched so very large carts stay under the DB's bind-parameter limit
+                OrderItem.objects.bulk_create(order_items_to_create, batch_size=500)
 
                 # 3f. Clear the Cart
-                cart.items.all().delete()
+                # CartItem has no dependents or delete signals, so Django's collector takes its
+                # fast path and this runs as a single DELETE ... WHERE cart_id = ?
+                CartItem.objects.filter(cart_id=cart.id).delete()
 
                 # 4. Success Response
                 return Response({
@@ -162,7 +214,11 @@ class CartView(views.APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        cart, created = Cart.objects.get_or_create(user=request.user)
+        # Prefetch items with their products so total_price and the nested
+        # serializers read from memory instead of querying per item
+        cart, created = Cart.objects.prefetch_related(
+            'items__product__category', 'items__product__images'
+        ).get_or_create(user=request.user)
         serializer = CartSerializer(cart)
         return Response(serializer.data)
 
@@ -179,19 +235,19 @@ class AddToCartView(views.APIView):
         if not product_slug:
             return Response({'error': 'Product slug is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        product = get_object_or_404(Product, slug=product_slug)
+        # Only the columns needed here; slug is unique, so this is an index lookup
+        product = get_object_or_404(Product.objects.only('id', 'stock'), slug=product_slug)
 
         if product.stock < quantity:
             return Response({'error': 'Not enough stock available.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
+        cart_item, created = CartItem.objects.get_or_create(
+            cart=cart, product=product, defaults={'quantity': quantity}
+        )
         
         if not created:
-            cart_item.quantity += quantity
-        else:
-            cart_item.quantity = quantity
-            
-        cart_item.save()
+            # Increment in the DB so concurrent adds can't overwrite each other
+            CartItem.objects.filter(pk=cart_item.pk).update(quantity=F('quantity') + quantity)
 
         return Response({'message': 'Artifact secured in vault'}, status=status.HTTP_200_OK)
 
@@ -239,21 +295,8 @@ class DefaultShippingAddressView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        user = self.request.user
-        
-        try:
-            # Find the address marked as default for the current user
-            default_address = ShippingAddress.objects.get(user=user, is_default=True)
-            return default_address
-        except ShippingAddress.DoesNotExist:
-            # If no default is found, check if ANY address exists (and use the first one)
-            try:
-                first_address = ShippingAddress.objects.filter(user=user).first()
-                if first_address:
-                    return first_address
-                else:
-                    # If the user has no addresses at all, return 404
-                    raise NotFound(detail="No default shipping address found for this user.")
-            except ShippingAddress.DoesNotExist:
-                # This should be covered by the previous `if`, but included for completeness
-                 raise NotFound(detail="No default shipping address found for this user.")
\ No newline at end of file
+        # The DB guarantees at most one default address per user
+        default_address = ShippingAddress.objects.filter(user=self.request.user, is_default=True).first()
+        if default_address is None:
+            raise NotFound(detail="No default shipping address found for this user.")
+        return default_address
\ No newline at end of file
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class PaymentsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'payments'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects cache invalidation receivers)
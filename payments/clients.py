@@ -0,0 +1,7 @@
+import stripe
+import razorpay
+from django.conf import settings
+
+# Initialize payment clients (shared by views and Celery tasks)
+stripe.api_key = settings.STRIPE_SECRET_KEY
+razorpay_client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
@@ -1,3 +1,7 @@
+from decimal import Decimal
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -6,6 +10,8 @@ class Product(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # price in the smallest currency unit (cents/paise), kept in sync by save()
+    amount_minor_units = models.PositiveIntegerField(default=0, editable=False)
     currency = models.CharField(max_length=3, default='USD', 
                                 choices=[('USD', 'USD'), ('INR', 'INR')])
     image = models.ImageField(upload_to='products/', blank=True, null=True)
@@ -16,6 +22,22 @@ class Product(models.Model):
     def __str__(self):
         return self.name
     
+    def save(self, **kwargs):
+        # str() first so prices assigned as strings or floats convert exactly
+        self.amount_minor_units = int(Decimal(str(self.price)) * 100)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'price' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'amount_minor_units'}
+        super().save(**kwargs)
+    
+    # Cache key for the listing's version token; deleted on any product change
+    CATALOG_VERSION_KEY = 'prod:catalog:version'
+    
+    @staticmethod
+    def active_cache_key(pk):
+        """Cache key for an active product looked up by the checkout views"""
+        return f'prod:active:{pk}'
+    
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Product'
@@ -47,7 +69,10 @@ class Payment(models.Model):
     
     # Payment identifiers
     payment_id = models.CharField(max_length=200, unique=True, db_index=True)
-    order_id = models.CharField(max_length=200, blank=True, null=True)
+    # Unguessable handle the checkout page polls while the provider call runs in Celery
+    checkout_token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    # Razorpay order id (one per payment); unique, which also indexes razorpay_verify's lookup
+    order_id = models.CharField(max_length=200, blank=True, null=True, unique=True)
     
     # Payment details
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -56,7 +81,7 @@ class Payment(models.Model):
     # Provider and status
     provider = models.CharField(max_length=20, choices=PROVIDER_CHOICES)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, 
-                             default='pending', db_index=True)
+                             default='pending')
     
     # Customer information
     customer_email = models.EmailField(blank=True, null=True)
@@ -81,8 +106,10 @@ class Payment(models.Model):
         verbose_name_plural = 'Payments'
         indexes = [
             models.Index(fields=['-created_at']),
-            models.Index(fields=['status']),
-            models.Index(fields=['provider']),
+            # payment_history filters by provider and/or status and sorts by -created_at;
+            # these also cover plain status/provider lookups via their leftmost column
+            models.Index(fields=['provider', 'status', '-created_at'], name='pay_prov_stat_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='pay_stat_created_idx'),
         ]
 
 
@@ -99,7 +126,7 @@ class Transaction(models.Model):
     status = models.CharField(max_length=50)
     
     # Raw data from payment provider
-    raw_response = models.JSONField(default=dict)
+    raw_response = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
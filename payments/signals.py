@@ -0,0 +1,11 @@
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Product
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    """Drop the cached copy of a product and the catalog ETag whenever it changes"""
+    cache.delete_many([Product.active_cache_key(instance.pk), Product.CATALOG_VERSION_KEY])
@@ -0,0 +1,118 @@
+from celery import shared_task
+from .clients import stripe, razorpay, razorpay_client
+from .models import Payment, PaymentLog
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def persist_payment_log(payload):
+    """Write a PaymentLog row outside the request/response cycle"""
+    PaymentLog.objects.create(**payload)
+
+
+def _mark_failed(payment, event_type, message):
+    # The error is kept on the payment so the checkout view/status endpoint can show it
+    payment.status = 'failed'
+    payment.metadata = {'error': message}
+    payment.save(update_fields=['status', 'metadata', 'updated_at'])
+    PaymentLog.objects.create(payment=payment, event_type=event_type, message=message, level='error')
+
+
+def _ensure_amount_minor_units(product):
+    """Backfill products saved before amount_minor_units existed (still 0)"""
+    if not product.amount_minor_units and product.price:
+        # save() recomputes amount_minor_units and adds it to update_fields
+        product.save(update_fields=['price'])
+
+
+@shared_task
+def create_stripe_intent(payment_pk):
+    """Create the Stripe PaymentIntent for a pending payment"""
+    payment = Payment.objects.select_related('product').get(pk=payment_pk)
+    product = payment.product
+    if product is None:
+        _mark_failed(payment, 'payment_intent_failed', 'Product no longer exists')
+        return
+    _ensure_amount_minor_units(product)
+    
+    try:
+        intent = stripe.PaymentIntent.create(
+            amount=product.amount_minor_units,
+            currency=product.currency.lower(),
+            metadata={
+                'product_id': product.id,
+                'product_name': product.name,
+                'customer_name': payment.customer_name,
+                'customer_email': payment.customer_email,
+            },
+            description=f"Payment for {product.name}",
+        )
+    except stripe.error.StripeError as e:
+        logger.error(f"Stripe error: {str(e)}")
+        _mark_failed(payment, 'payment_intent_failed', f'Stripe error: {str(e)}')
+        return
+    
+    # The webhook looks payments up by intent id, so it replaces the placeholder.
+    # The recorded amount is the one just charged, read from this DB row rather
+    # than the (possibly cached) product the view saw.
+    payment.payment_id = intent.id
+    payment.amount = product.price
+    payment.metadata = {
+        'intent_id': intent.id,
+        'client_secret': intent.client_secret,
+    }
+    payment.save(update_fields=['payment_id', 'amount', 'metadata', 'updated_at'])
+    
+    PaymentLog.objects.create(
+        payment=payment,
+        event_type='payment_intent_created',
+        message=f'Stripe payment intent created for {product.name}',
+        data={'intent_id': intent.id, 'amount': product.amount_minor_units}
+    )
+
+
+@shared_task
+def create_razorpay_order(payment_pk):
+    """Create the Razorpay order for a pending payment"""
+    payment = Payment.objects.select_related('product').get(pk=payment_pk)
+    product = payment.product
+    if product is None:
+        _mark_failed(payment, 'order_failed', 'Product no longer exists')
+        return
+    _ensure_amount_minor_units(product)
+    
+    order_data = {
+        'amount': product.amount_minor_units,
+        'currency': 'INR',
+        'payment_capture': 1,
+        'notes': {
+            'product_id': str(product.id),
+            'product_name': product.name,
+            'customer_name': payment.customer_name,
+            'customer_email': payment.customer_email,
+        }
+    }
+    
+    try:
+        order = razorpay_client.order.create(data=order_data)
+    except razorpay.errors.BadRequestError as e:
+        logger.error(f"Razorpay error: {str(e)}")
+        _mark_failed(payment, 'order_failed', f'Razorpay error: {str(e)}')
+        return
+    
+    payment.order_id = order['id']
+    payment.amount = product.price
+    payment.metadata = {
+        'order_id': order['id'],
+        'amount': product.amount_minor_units,
+    }
+    payment.save(update_fields=['order_id', 'amount', 'metadata', 'updated_at'])
+    
+    PaymentLog.objects.create(
+        payment=payment,
+        event_type='order_created',
+        message=f'Razorpay order created for {product.name}',
+        data={'order_id': order['id'], 'amount': product.amount_minor_units}
+    )
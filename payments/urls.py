@@ -15,12 +15,16 @@ urlpatterns = [
     path('razorpay/payment/<int:pk>/', views.razorpay_payment, name='razorpay_payment'),
     path('razorpay/verify/', views.razorpay_verify, name='razorpay_verify'),
     
+    # Checkout status (polled while the provider call runs in the background)
+    path('checkout-status/<uuid:token>/', views.payment_checkout_status, name='payment_checkout_status'),
+    
     # Success/Failure
     path('success/', views.payment_success, name='payment_success'),
     path('failed/', views.payment_failed, name='payment_failed'),
     
     # Payment history
     path('history/', views.payment_history, name='payment_history'),
+    path('history/export/', views.payment_export, name='payment_export'),
     path('payment/<int:pk>/', views.payment_detail, name='payment_detail'),
     
     # Dashboard
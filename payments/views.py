@@ -1,50 +1,124 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
+from django.contrib.messages import get_messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.paginator import Paginator
 from django.conf import settings
-from django.http import JsonResponse, HttpResponse
+from django.core.cache import cache
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_POST, etag
+from django.views.decorators.cache import cache_control
+from django.views.decorators.vary import vary_on_headers
 from django.utils import timezone
+from django.db import transaction
+from django.db.models import Prefetch
 from .models import Product, Payment, Transaction, PaymentLog
-import stripe
-import razorpay
+from .tasks import persist_payment_log, create_stripe_intent, create_razorpay_order
+from .clients import stripe, razorpay, razorpay_client
+from ecommerce.middleware import n_plus_one_threshold
+import csv
+import itertools
 import json
 import uuid
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Initialize payment clients
-stripe.api_key = settings.STRIPE_SECRET_KEY
-razorpay_client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-
 
 def log_payment_event(payment, event_type, message, data=None, level='info'):
     """Helper function to log payment events"""
-    PaymentLog.objects.create(
-        payment=payment,
-        event_type=event_type,
-        message=message,
-        data=data or {},
-        level=level
+    payload = {
+        'payment_id': payment.pk if payment else None,
+        'event_type': event_type,
+        'message': message,
+        'data': data or {},
+        'level': level,
+    }
+    if getattr(settings, 'PAYMENTS_ASYNC_LOGS', False):
+        # Needs a Celery worker with this app installed. Enqueued after commit so a log
+        # never points at a rolled-back payment; robust so a broker outage can't turn
+        # an already-committed payment into a 500.
+        transaction.on_commit(lambda: persist_payment_log.delay(payload), robust=True)
+    else:
+        PaymentLog.objects.create(**payload)
+
+
+PRODUCT_CACHE_TIMEOUT = 300  # seconds
+
+
+def product_cache_is_shared():
+    """
+    Products are only cached when every worker sees the same cache: with a
+    per-process cache the post_save invalidation would only reach one worker.
+    """
+    return settings.CACHES['default']['BACKEND'] not in (
+        'django.core.cache.backends.locmem.LocMemCache',
+        'django.core.cache.backends.dummy.DummyCache',
     )
 
 
+def get_active_product(pk):
+    """Return an active product by pk, cached; raises Http404 like get_object_or_404"""
+    if not product_cache_is_shared():
+        return get_object_or_404(Product, pk=pk, is_active=True)
+    key = Product.active_cache_key(pk)
+    product = cache.get(key)
+    if product is None:
+        product = get_object_or_404(Product, pk=pk, is_active=True)
+        cache.set(key, product, PRODUCT_CACHE_TIMEOUT)
+    return product
+
+
+def has_pending_messages(request):
+    """True when the page will render flash messages (len() does not consume them)"""
+    return len(get_messages(request)) > 0
+
+
+def catalog_etag(request):
+    """ETag for the product listing; a new token is issued after any product change"""
+    # The token lives in the cache, so a per-process cache would leave other workers
+    # answering 304 for a listing that changed elsewhere
+    if has_pending_messages(request) or not product_cache_is_shared():
+        return None
+    return cache.get_or_set(Product.CATALOG_VERSION_KEY, lambda: uuid.uuid4().hex, PRODUCT_CACHE_TIMEOUT)
+
+
+def product_etag(request, pk):
+    """ETag for a product page, taken from the cached product's updated_at"""
+    if has_pending_messages(request):
+        return None
+    return get_active_product(pk).updated_at.isoformat()
+
+
 # ==================== HOME & PRODUCT VIEWS ====================
 
+# These pages render per-user flash messages, so only the browser may keep a copy and
+# it must revalidate every time; the ETag makes that a 304 with no DB queries. No ETag
+# is sent while messages are pending, so they are always rendered and never reused.
+@cache_control(private=True, no_cache=True)
+@vary_on_headers('Accept-Language', 'Cookie')
+@etag(catalog_etag)
 def home(request):
     """Display all active products"""
-    products = Product.objects.filter(is_active=True)
+    # Evaluated once; the count comes from the list instead of a second COUNT(*) query
+    products = list(
+        Product.objects.filter(is_active=True).defer('description')
+    )
     context = {
         'products': products,
-        'total_products': products.count(),
+        'total_products': len(products),
     }
     return render(request, 'payments/home.html', context)
 
 
+@cache_control(private=True, no_cache=True)
+@vary_on_headers('Accept-Language', 'Cookie')
+@etag(product_etag)
 def product_detail(request, pk):
     """Display product details"""
-    product = get_object_or_404(Product, pk=pk, is_active=True)
+    product = get_active_product(pk)
     context = {
         'product': product,
     }
@@ -53,7 +127,7 @@ def product_detail(request, pk):
 
 def payment_selection(request, pk):
     """Payment method selection page"""
-    product = get_object_or_404(Product, pk=pk, is_active=True)
+    product = get_active_product(pk)
     context = {
         'product': product,
         'stripe_enabled': bool(settings.STRIPE_PUBLIC_KEY),
@@ -66,7 +140,7 @@ def payment_selection(request, pk):
 
 def stripe_payment(request, pk):
     """Stripe payment form"""
-    product = get_object_or_404(Product, pk=pk, is_active=True)
+    product = get_active_product(pk)
     
     if request.method == 'POST':
         try:
@@ -78,48 +152,31 @@ def stripe_payment(request, pk):
                 messages.error(request, 'Please provide both name and email')
                 return redirect('stripe_payment', pk=pk)
             
-            # Create Stripe Payment Intent
-            amount = int(product.price * 100)  # Convert to cents
-            
-            intent = stripe.PaymentIntent.create(
-                amount=amount,
-                currency=product.currency.lower(),
-                metadata={
-                    'product_id': product.id,
-                    'product_name': product.name,
-                    'customer_name': customer_name,
-                    'customer_email': customer_email,
-                },
-                description=f"Payment for {product.name}",
-            )
-            
-            # Create payment record
+            # Create payment record, then the PaymentIntent (inline, or in Celery when enabled)
             payment = Payment.objects.create(
                 product=product,
-                payment_id=intent.id,
+                payment_id=str(uuid.uuid4()),  # Temporary ID, replaced by the intent id
                 amount=product.price,
                 currency=product.currency,
                 provider='stripe',
                 status='pending',
                 customer_email=customer_email,
                 customer_name=customer_name,
-                metadata={
-                    'intent_id': intent.id,
-                    'client_secret': intent.client_secret,
-                }
-            )
-            
-            # Log event
-            log_payment_event(
-                payment=payment,
-                event_type='payment_intent_created',
-                message=f'Stripe payment intent created for {product.name}',
-                data={'intent_id': intent.id, 'amount': amount}
             )
+            if getattr(settings, 'PAYMENTS_ASYNC_CHECKOUT', False):
+                # The checkout page polls status_url until the worker has filled these in
+                transaction.on_commit(lambda: create_stripe_intent.delay(payment.pk))
+            else:
+                create_stripe_intent(payment.pk)
+            payment.refresh_from_db()
+            if payment.status == 'failed':
+                messages.error(request, f"Payment error: {payment.metadata.get('error')}")
+                return redirect('product_detail', pk=pk)
             
             context = {
                 'product': product,
-                'client_secret': intent.client_secret,
+                'client_secret': payment.metadata.get('client_secret'),
+                'status_url': reverse('payment_checkout_status', args=[payment.checkout_token]),
                 'stripe_public_key': settings.STRIPE_PUBLIC_KEY,
                 'payment': payment,
                 'customer_name': customer_name,
@@ -128,10 +185,6 @@ def stripe_payment(request, pk):
             
             return render(request, 'payments/stripe_checkout.html', context)
             
-        except stripe.error.StripeError as e:
-            logger.error(f"Stripe error: {str(e)}")
-            messages.error(request, f'Payment error: {str(e)}')
-            return redirect('product_detail', pk=pk)
         except Exception as e:
             logger.error(f"Error creating payment: {str(e)}")
             messages.error(request, f'Error: {str(e)}')
@@ -166,27 +219,35 @@ def stripe_webhook(request):
         payment_intent = event['data']['object']
         
         try:
-            payment = Payment.objects.get(payment_id=payment_intent['id'])
-            payment.status = 'succeeded'
-            payment.completed_at = timezone.now()
-            payment.save()
-            
-            # Create transaction record
-            Transaction.objects.create(
-                payment=payment,
-                transaction_id=payment_intent.get('id'),
-                transaction_type='charge',
-                amount=payment.amount,
-                status='succeeded',
-                raw_response=payment_intent
-            )
-            
-            log_payment_event(
-                payment=payment,
-                event_type='payment_succeeded',
-                message='Payment completed successfully',
-                data=payment_intent
-            )
+            # One transaction per event; the row lock serializes Stripe's duplicate deliveries
+            with transaction.atomic():
+                payment = Payment.objects.select_for_update().get(payment_id=payment_intent['id'])
+                if payment.status == 'succeeded':
+                    # Already processed (Stripe delivers webhooks at least once)
+                    return HttpResponse(status=200)
+                
+                payment.status = 'succeeded'
+                payment.completed_at = timezone.now()
+                # Only the changed columns; leaves metadata/notes untouched
+                payment.save(update_fields=['status', 'completed_at', 'updated_at'])
+                
+                # Create transaction record
+                Transaction.objects.create(
+                    payment=payment,
+                    transaction_id=payment_intent.get('id'),
+                    transaction_type='charge',
+                    amount=payment.amount,
+                    status='succeeded',
+                    raw_response=payment_intent
+                )
+                
+                log_payment_event(
+                    payment=payment,
+                    event_type='payment_succeeded',
+                    message='Payment completed successfully',
+                    # Raw payload is already stored on Transaction.raw_response
+                    data={'intent_id': payment_intent['id']}
+                )
             
         except Payment.DoesNotExist:
             logger.warning(f"Payment not found for intent: {payment_intent['id']}")
@@ -195,17 +256,22 @@ def stripe_webhook(request):
         payment_intent = event['data']['object']
         
         try:
-            payment = Payment.objects.get(payment_id=payment_intent['id'])
-            payment.status = 'failed'
-            payment.save()
-            
-            log_payment_event(
-                payment=payment,
-                event_type='payment_failed',
-                message='Payment failed',
-                data=payment_intent,
-                level='error'
-            )
+            with transaction.atomic():
+                payment = Payment.objects.select_for_update().get(payment_id=payment_intent['id'])
+                if payment.status in ('succeeded', 'failed'):
+                    # Duplicate delivery, or a late failure for an intent that already succeeded
+                    return HttpResponse(status=200)
+                
+                payment.status = 'failed'
+                payment.save(update_fields=['status', 'updated_at'])
+                
+                log_payment_event(
+                    payment=payment,
+                    event_type='payment_failed',
+                    message='Payment failed',
+                    data=payment_intent,
+                    level='error'
+                )
             
         except Payment.DoesNotExist:
             logger.warning(f"Payment not found for intent: {payment_intent['id']}")
@@ -217,7 +283,7 @@ def stripe_webhook(request):
 
 def razorpay_payment(request, pk):
     """Razorpay payment form"""
-    product = get_object_or_404(Product, pk=pk, is_active=True)
+    product = get_active_product(pk)
     
     if request.method == 'POST':
         try:
@@ -230,28 +296,10 @@ def razorpay_payment(request, pk):
                 messages.error(request, 'Please provide both name and email')
                 return redirect('razorpay_payment', pk=pk)
             
-            # Create Razorpay Order
-            amount = int(product.price * 100)  # Convert to paise
-            
-            order_data = {
-                'amount': amount,
-                'currency': 'INR',
-                'payment_capture': 1,
-                'notes': {
-                    'product_id': str(product.id),
-                    'product_name': product.name,
-                    'customer_name': customer_name,
-                    'customer_email': customer_email,
-                }
-            }
-            
-            order = razorpay_client.order.create(data=order_data)
-            
-            # Create payment record
+            # Create payment record, then the Razorpay order (inline, or in Celery when enabled)
             payment = Payment.objects.create(
                 product=product,
                 payment_id=str(uuid.uuid4()),  # Temporary ID, will be updated on verification
-                order_id=order['id'],
                 amount=product.price,
                 currency='INR',
                 provider='razorpay',
@@ -259,22 +307,22 @@ def razorpay_payment(request, pk):
                 customer_email=customer_email,
                 customer_name=customer_name,
                 customer_phone=customer_phone,
-                metadata={
-                    'order_id': order['id'],
-                }
-            )
-            
-            log_payment_event(
-                payment=payment,
-                event_type='order_created',
-                message=f'Razorpay order created for {product.name}',
-                data={'order_id': order['id'], 'amount': amount}
             )
+            if getattr(settings, 'PAYMENTS_ASYNC_CHECKOUT', False):
+                # The checkout page polls status_url until the worker has filled these in
+                transaction.on_commit(lambda: create_razorpay_order.delay(payment.pk))
+            else:
+                create_razorpay_order(payment.pk)
+            payment.refresh_from_db()
+            if payment.status == 'failed':
+                messages.error(request, f"Payment error: {payment.metadata.get('error')}")
+                return redirect('product_detail', pk=pk)
             
             context = {
                 'product': product,
-                'order_id': order['id'],
-                'amount': amount,
+                'order_id': payment.order_id,
+                'status_url': reverse('payment_checkout_status', args=[payment.checkout_token]),
+                'amount': payment.metadata.get('amount'),  # Paise, as sent to Razorpay by the task
                 'currency': 'INR',
                 'razorpay_key': settings.RAZORPAY_KEY_ID,
                 'payment': payment,
@@ -285,10 +333,6 @@ def razorpay_payment(request, pk):
             
             return render(request, 'payments/razorpay_checkout.html', context)
             
-        except razorpay.errors.BadRequestError as e:
-            logger.error(f"Razorpay error: {str(e)}")
-            messages.error(request, f'Payment error: {str(e)}')
-            return redirect('product_detail', pk=pk)
         except Exception as e:
             logger.error(f"Error creating order: {str(e)}")
             messages.error(request, f'Error: {str(e)}')
@@ -317,29 +361,38 @@ def razorpay_verify(request):
         # This will raise an exception if signature is invalid
         razorpay_client.utility.verify_payment_signature(params_dict)
         
-        # Update payment record
-        payment = Payment.objects.get(order_id=data['razorpay_order_id'])
-        payment.payment_id = data['razorpay_payment_id']
-        payment.status = 'succeeded'
-        payment.completed_at = timezone.now()
-        payment.save()
-        
-        # Create transaction record
-        Transaction.objects.create(
-            payment=payment,
-            transaction_id=data['razorpay_payment_id'],
-            transaction_type='charge',
-            amount=payment.amount,
-            status='succeeded',
-            raw_response=data
-        )
-        
-        log_payment_event(
-            payment=payment,
-            event_type='payment_verified',
-            message='Razorpay payment verified successfully',
-            data=data
-        )
+        # Update payment record under a row lock so duplicate verifications are serialized
+        with transaction.atomic():
+            payment = Payment.objects.select_for_update().get(order_id=data['razorpay_order_id'])
+            if payment.status == 'succeeded':
+                # Already verified; nothing to write
+                return JsonResponse({
+                    'status': 'success',
+                    'payment_id': payment.payment_id
+                })
+            
+            payment.payment_id = data['razorpay_payment_id']
+            payment.status = 'succeeded'
+            payment.completed_at = timezone.now()
+            payment.save(update_fields=['payment_id', 'status', 'completed_at', 'updated_at'])
+            
+            # Create transaction record
+            Transaction.objects.create(
+                payment=payment,
+                transaction_id=data['razorpay_payment_id'],
+                transaction_type='charge',
+                amount=payment.amount,
+                status='succeeded',
+                raw_response=data
+            )
+            
+            log_payment_event(
+                payment=payment,
+                event_type='payment_verified',
+                message='Razorpay payment verified successfully',
+                # Raw payload is already stored on Transaction.raw_response
+                data={'order_id': data['razorpay_order_id']}
+            )
         
         return JsonResponse({
             'status': 'success',
@@ -366,6 +419,26 @@ def razorpay_verify(request):
         }, status=400)
 
 
+def payment_checkout_status(request, token):
+    """Polled by the checkout pages until the provider intent/order exists"""
+    payment = get_object_or_404(
+        Payment.objects.only('provider', 'status', 'order_id', 'metadata'),
+        checkout_token=token
+    )
+    
+    if payment.status == 'failed':
+        return JsonResponse({'status': 'failed', 'error': payment.metadata.get('error')})
+    
+    if payment.provider == 'stripe':
+        client_secret = payment.metadata.get('client_secret')
+        if client_secret:
+            return JsonResponse({'status': 'ready', 'client_secret': client_secret})
+    elif payment.order_id:
+        return JsonResponse({'status': 'ready', 'order_id': payment.order_id})
+    
+    return JsonResponse({'status': 'pending'})
+
+
 # ==================== SUCCESS & FAILURE PAGES ====================
 
 def payment_success(request):
@@ -392,9 +465,12 @@ def payment_failed(request):
 
 # ==================== PAYMENT HISTORY ====================
 
+@n_plus_one_threshold(1)
 def payment_history(request):
     """Display all payments"""
-    payments = Payment.objects.select_related('product').all()
+    payments = Payment.objects.select_related('product').only(
+        'id', 'payment_id', 'status', 'provider', 'amount', 'currency', 'created_at', 'product__name'
+    )
     
     # Filter by status if provided
     status_filter = request.GET.get('status')
@@ -406,8 +482,13 @@ def payment_history(request):
     if provider_filter:
         payments = payments.filter(provider=provider_filter)
     
+    # Only one page of rows is loaded: one COUNT plus one LIMIT/OFFSET query
+    paginator = Paginator(payments, 25)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
     context = {
-        'payments': payments,
+        'page_obj': page_obj,
+        'payments': page_obj,
         'status_filter': status_filter,
         'provider_filter': provider_filter,
         'status_choices': Payment.STATUS_CHOICES,
@@ -416,56 +497,107 @@ def payment_history(request):
     return render(request, 'payments/payment_history.html', context)
 
 
+class _Echo:
+    """File-like object whose write() just returns the value, for streaming csv rows"""
+    def write(self, value):
+        return value
+
+
+# Leading characters that make spreadsheet apps evaluate a cell as a formula
+_CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_safe(value):
+    """Prefix user-supplied text with ' so it can't run as a formula (CSV injection)"""
+    if isinstance(value, str) and value.startswith(_CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+@staff_member_required
+def payment_export(request):
+    """Stream payments as CSV without loading the whole table into memory"""
+    payments = Payment.objects.select_related('product').only(
+        'payment_id', 'order_id', 'provider', 'status', 'amount', 'currency',
+        'customer_email', 'created_at', 'completed_at', 'product__name'
+    )
+    
+    status_filter = request.GET.get('status')
+    if status_filter:
+        payments = payments.filter(status=status_filter)
+    
+    provider_filter = request.GET.get('provider')
+    if provider_filter:
+        payments = payments.filter(provider=provider_filter)
+    
+    writer = csv.writer(_Echo())
+    header = ['payment_id', 'order_id', 'provider', 'status', 'amount', 'currency',
+              'customer_email', 'product', 'created_at', 'completed_at']
+    # iterator() streams rows from a DB cursor in chunks instead of filling the result cache
+    rows = (
+        [_csv_safe(value) for value in (
+            p.payment_id, p.order_id, p.provider, p.status, p.amount, p.currency,
+            p.customer_email, p.product.name if p.product else '', p.created_at, p.completed_at,
+        )]
+        for p in payments.iterator(chunk_size=2000)
+    )
+    
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in itertools.chain([header], rows)),
+        content_type='text/csv'
+    )
+    response['Content-Disposition'] = 'attachment; filename="payments.csv"'
+    return response
+
+
 def payment_detail(request, pk):
     """Display payment details"""
     payment = get_object_or_404(
-        Payment.objects.select_related('product'),
+        Payment.objects.select_related('product').prefetch_related(
+            'transactions',
+            Prefetch(
+                'logs',
+                queryset=PaymentLog.objects.order_by('-created_at')[:20],  # Last 20 logs
+                to_attr='recent_logs',
+            ),
+        ),
         pk=pk
     )
-    transactions = payment.transactions.all()
-    logs = payment.logs.all()[:20]  # Last 20 logs
     
     context = {
         'payment': payment,
-        'transactions': transactions,
-        'logs': logs,
+        'transactions': payment.transactions.all(),
+        'logs': payment.recent_logs,
     }
     return render(request, 'payments/payment_detail.html', context)
 
 
 # ==================== DASHBOARD ====================
 
+@n_plus_one_threshold(1)
 def dashboard(request):
     """Admin dashboard with payment statistics"""
     from django.db.models import Sum, Count, Q
-    from datetime import timedelta
     
-    # Get statistics
-    total_payments = Payment.objects.count()
-    successful_payments = Payment.objects.filter(status='succeeded').count()
-    failed_payments = Payment.objects.filter(status='failed').count()
-    pending_payments = Payment.objects.filter(status='pending').count()
-    
-    # Revenue statistics
-    total_revenue = Payment.objects.filter(
-        status='succeeded'
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    # All statistics in a single pass over the Payment table
+    stats = Payment.objects.aggregate(
+        total_payments=Count('id'),
+        successful_payments=Count('id', filter=Q(status='succeeded')),
+        failed_payments=Count('id', filter=Q(status='failed')),
+        pending_payments=Count('id', filter=Q(status='pending')),
+        stripe_count=Count('id', filter=Q(provider='stripe')),
+        razorpay_count=Count('id', filter=Q(provider='razorpay')),
+        total_revenue=Sum('amount', filter=Q(status='succeeded')),
+    )
     
     # Recent payments
-    recent_payments = Payment.objects.select_related('product').order_by('-created_at')[:10]
-    
-    # Provider statistics
-    stripe_count = Payment.objects.filter(provider='stripe').count()
-    razorpay_count = Payment.objects.filter(provider='razorpay').count()
+    recent_payments = Payment.objects.select_related('product').only(
+        'id', 'payment_id', 'status', 'provider', 'amount', 'currency', 'created_at', 'product__name'
+    ).order_by('-created_at')[:10]
     
     context = {
-        'total_payments': total_payments,
-        'successful_payments': successful_payments,
-        'failed_payments': failed_payments,
-        'pending_payments': pending_payments,
-        'total_revenue': total_revenue,
+        **stats,
+        'total_revenue': stats['total_revenue'] or 0,
         'recent_payments': recent_payments,
-        'stripe_count': stripe_count,
-        'razorpay_count': razorpay_count,
     }
     return render(request, 'payments/dashboard.html', context)
\ No newline at end of file